@@ -9,6 +9,19 @@ TEMPLATE_SHIELD_PATH = "shield_template.png"  # Убедитесь, что фа
 # Путь к локальному файлу с шаблоном картины
 TEMPLATE_PAINTING_PATH = "painting_template.png"  # Убедитесь, что файл существует
 
+# Быстрый запуск
+STARTUP_CONFIG = {
+    "image_formats": ["PNG", "JPEG"],  # Кодеки Pillow, которые загружаются (None — все)
+    "warmup": True  # Прогрев шаблонов и потоков до начала опроса
+}
+
+# Сборка ресурспаков
+PACK_BUILD_CONFIG = {
+    "deterministic": False,  # Одинаковые входные данные дают одинаковый архив
+    "cache_dir": "pack_cache",  # Каталог кэша готовых архивов (детерминированный режим)
+    "cache_max_bytes": 200 * 1024 * 1024  # Максимальный размер кэша (0 — кэш отключен)
+}
+
 # Опции ресурсов
 RESOURCE_OPTIONS = {
     "ender_pearl": "Ender Pearl",
@@ -76,5 +89,9 @@ NEW_PAINTING_IMAGE_SIZES = {
 LOGGING_CONFIG = {
     "level": "INFO",  # Уровень логирования (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     "format": "%(asctime)s - %(levelname)s - %(message)s",  # Формат логов
-    "filename": "bot.log"  # Имя файла для сохранения логов (необязательно)
+    "filename": "bot.log",  # Имя файла для сохранения логов (необязательно)
+    "queue_size": 10000,  # Размер очереди записей; при переполнении записи отбрасываются
+    "events_mode": "full",  # Режим частых событий: full, sample или structured (JSON)
+    "events_sample_rate": 20,  # В режиме sample записывается каждое N-е событие
+    "sampled_loggers": ["bot.events"]  # Логгеры частых событий (например, добавить "aiogram.event")
 }
@@ -5,23 +5,34 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from config import RESOURCE_OPTIONS, TEMPLATE_SHIELD_PATH, TEMPLATE_PAINTING_PATH, PAINTING_COLORS, NEW_PAINTING_IMAGE_SIZES
-from utils import process_image, process_shield, process_painting, create_resource_pack, create_zip_file
+from config import RESOURCE_OPTIONS, TEMPLATE_SHIELD_PATH, TEMPLATE_PAINTING_PATH, PAINTING_COLORS, NEW_PAINTING_IMAGE_SIZES, STARTUP_CONFIG, PACK_BUILD_CONFIG
+from utils import process_image, process_shield, process_painting, create_resource_pack, create_zip_file, load_pil, warmup_templates, pack_digest, template_digest, PACK_CACHE_VERSION
+from pack_cache import PackCache
 import logging
 import asyncio
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 router = Router()
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[logging.FileHandler("bot.log"), logging.StreamHandler()]
-)
-
 # Пул потоков для выполнения тяжелых задач
-executor = ThreadPoolExecutor(max_workers=5)
+EXECUTOR_WORKERS = 5
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+
+# Кэш готовых ресурспаков (только в детерминированном режиме)
+pack_cache = None
+if PACK_BUILD_CONFIG.get("deterministic") and PACK_BUILD_CONFIG.get("cache_max_bytes"):
+    pack_cache = PackCache(PACK_BUILD_CONFIG["cache_dir"], PACK_BUILD_CONFIG["cache_max_bytes"])
+
+# Шаблоны и настройки, от которых зависит результат сборки
+RESOURCE_TEMPLATES = {
+    "shield": TEMPLATE_SHIELD_PATH,
+    "painting": TEMPLATE_PAINTING_PATH,
+}
+RESOURCE_CONFIG_INPUTS = {
+    "painting": PAINTING_COLORS,
+    "new_painting": NEW_PAINTING_IMAGE_SIZES,
+}
 
 # Глобальные переменные для очереди и семафора Painting
 painting_semaphore = asyncio.Semaphore(5)
@@ -32,6 +43,41 @@ async def run_in_executor(func, *args):
     loop = asyncio.get_running_loop()
     return await loop.run_in_executor(executor, func, *args)
 
+def pack_cache_key(resource, pack_name, inputs):
+    """Ключ кэша по версии сборки, типу ресурса, названию, шаблону, настройкам и изображениям"""
+    if pack_cache is None:
+        return None
+    template = RESOURCE_TEMPLATES.get(resource)
+    return pack_digest(
+        PACK_CACHE_VERSION,
+        resource,
+        pack_name,
+        template_digest(template) if template else "",
+        RESOURCE_CONFIG_INPUTS.get(resource, ()),
+        inputs
+    )
+
+async def send_pack(message: Message, zip_data: bytes, pack_name: str):
+    await message.answer_document(
+        BufferedInputFile(zip_data, filename=f"{pack_name}.mcpack"),
+        caption="✅ Ваш ресурспак готов!"
+    )
+
+async def send_cached_pack(message: Message, cache_key, pack_name):
+    """Отправка ресурспака из кэша; True, если архив найден"""
+    if cache_key is None:
+        return False
+    zip_data = await run_in_executor(pack_cache.get, cache_key)
+    if zip_data is None:
+        return False
+    logging.info("Ресурспак %s отдан из кэша", pack_name)
+    await send_pack(message, zip_data, pack_name)
+    return True
+
+async def store_cached_pack(cache_key, zip_data):
+    if cache_key is not None:
+        await run_in_executor(pack_cache.put, cache_key, zip_data)
+
 class Form(StatesGroup):
     selected_resource = State()
     pack_name = State()
@@ -57,7 +103,7 @@ async def process_painting_queue():
         
         # Проверяем, активен ли процесс пользователя
         if not user_data.get(chat_id, {}).get("in_process", False):
-            logging.info(f"Задача для chat_id {chat_id} отменена, пропускаем.")
+            logging.info("Задача для chat_id %s отменена, пропускаем.", chat_id)
             painting_queue.task_done()
             continue
         
@@ -65,6 +111,10 @@ async def process_painting_queue():
             async with painting_semaphore:
                 await task['message'].answer("🔄 Ваш запрос на обработку Painting начал выполняться. Пожалуйста, подождите...")
                 
+                cache_key = await run_in_executor(pack_cache_key, 'painting', task['pack_name'], task['images'])
+                if await send_cached_pack(task['message'], cache_key, task['pack_name']):
+                    continue
+                
                 processed = await run_in_executor(
                     process_painting, task['images'], TEMPLATE_PAINTING_PATH, PAINTING_COLORS
                 )
@@ -77,12 +127,10 @@ async def process_painting_queue():
                 )
                 
                 zip_data = await run_in_executor(create_zip_file, task['pack_name'])
-                await task['message'].answer_document(
-                    BufferedInputFile(zip_data, filename=f"{task['pack_name']}.mcpack"),
-                    caption="✅ Ваш ресурспак готов!"
-                )
+                await send_pack(task['message'], zip_data, task['pack_name'])
+                await store_cached_pack(cache_key, zip_data)
         except Exception as e:
-            logging.error(f"Ошибка обработки Painting: {e}")
+            logging.error("Ошибка обработки Painting: %s", e)
             await task['message'].answer(f"❌ Ошибка при обработке: {str(e)}")
         finally:
             init_user_data(chat_id)
@@ -187,10 +235,15 @@ async def handle_image(message: Message, state: FSMContext):
             if len(user_data[chat_id]["images"]) < 2:
                 await message.answer("Отправьте второе изображение:")
             else:
+                cache_key = await run_in_executor(pack_cache_key, resource, user_data[chat_id]["pack_name"], user_data[chat_id]["images"])
+                if await send_cached_pack(message, cache_key, user_data[chat_id]["pack_name"]):
+                    init_user_data(chat_id)
+                    await state.clear()
+                    return
                 processed = await run_in_executor(process_shield, *user_data[chat_id]["images"], TEMPLATE_SHIELD_PATH)
                 if processed is None:
                     raise ValueError("Ошибка обработки изображения щита")
-                await send_resource(message, processed, resource, state)
+                await send_resource(message, processed, resource, state, cache_key)
 
         elif resource == "painting":
             required = len(PAINTING_COLORS)
@@ -232,13 +285,18 @@ async def handle_image(message: Message, state: FSMContext):
                 await message.answer("✅ Изображение уже получено! Идет обработка...")
                 return
             user_data[chat_id]["images"].append(image_data)
+            cache_key = await run_in_executor(pack_cache_key, resource, user_data[chat_id]["pack_name"], image_data)
+            if await send_cached_pack(message, cache_key, user_data[chat_id]["pack_name"]):
+                init_user_data(chat_id)
+                await state.clear()
+                return
             processed = await run_in_executor(process_image, image_data, resource)
             if processed is None:
                 raise ValueError("Ошибка обработки изображения")
-            await send_resource(message, processed, resource, state)
+            await send_resource(message, processed, resource, state, cache_key)
 
     except Exception as e:
-        logging.error(f"Ошибка обработки: {e}")
+        logging.error("Ошибка обработки: %s", e)
         await message.answer(f"❌ Ошибка обработки файла: {str(e)}")
         await state.clear()
         init_user_data(chat_id)
@@ -250,6 +308,15 @@ async def request_next_image(message: Message, state: FSMContext):
         required = set(NEW_PAINTING_IMAGE_SIZES.keys())
         uploaded = set(user_data[chat_id]["new_painting_images"].keys())
         if uploaded == required:
+            # Изображения New Painting обрабатываются по мере загрузки, поэтому
+            # кэш позволяет пропустить только сборку и упаковку
+            cache_key = await run_in_executor(
+                pack_cache_key, resource, user_data[chat_id]["pack_name"], user_data[chat_id]["new_painting_images"]
+            )
+            if await send_cached_pack(message, cache_key, user_data[chat_id]["pack_name"]):
+                init_user_data(chat_id)
+                await state.clear()
+                return
             await message.answer("Создание... Подождите...")
             await run_in_executor(
                 create_resource_pack,
@@ -257,7 +324,7 @@ async def request_next_image(message: Message, state: FSMContext):
                 user_data[chat_id]["pack_name"],
                 resource
             )
-            await send_zip(message)
+            await send_zip(message, cache_key)
             init_user_data(chat_id)
             await state.clear()
             return
@@ -273,34 +340,47 @@ async def request_next_image(message: Message, state: FSMContext):
 async def handle_extra_images(message: Message):
     await message.answer("⚠️ Отправка файлов завершена! Используйте /start для нового процесса")
 
-async def send_resource(message: Message, image_data: bytes, resource_type: str, state: FSMContext):
+async def send_resource(message: Message, image_data: bytes, resource_type: str, state: FSMContext, cache_key=None):
     chat_id = message.chat.id
     try:
         if not all([user_data[chat_id]["pack_name"], image_data]):
             raise ValueError("Отсутствуют данные для сборки")
         await message.answer("Создание... Подождите...")
         await run_in_executor(create_resource_pack, image_data, user_data[chat_id]["pack_name"], resource_type)
-        await send_zip(message)
+        await send_zip(message, cache_key)
     except Exception as e:
-        logging.error(f"Ошибка создания пакета: {e}")
+        logging.error("Ошибка создания пакета: %s", e)
         await message.answer(f"❌ Ошибка создания ресурспака: {str(e)}")
     finally:
         init_user_data(chat_id)
         await state.clear()
 
-async def send_zip(message: Message):
+async def send_zip(message: Message, cache_key=None):
     chat_id = message.chat.id
     try:
         zip_data = await run_in_executor(create_zip_file, user_data[chat_id]["pack_name"])
-        await message.answer_document(
-            BufferedInputFile(zip_data, filename=f"{user_data[chat_id]['pack_name']}.mcpack"),
-            caption="✅ Ваш ресурспак готов!"
-        )
+        await send_pack(message, zip_data, user_data[chat_id]["pack_name"])
+        await store_cached_pack(cache_key, zip_data)
     except Exception as e:
-        logging.error(f"Ошибка отправки: {e}")
+        logging.error("Ошибка отправки: %s", e)
         await message.answer("❌ Ошибка отправки файла!")
 
+async def warmup():
+    """Прогрев шаблонов и потоков пула до начала опроса"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # Одновременная отправка задач запускает все потоки пула
+    tasks = [loop.run_in_executor(executor, warmup_templates, TEMPLATE_SHIELD_PATH, TEMPLATE_PAINTING_PATH, PAINTING_COLORS)]
+    tasks += [loop.run_in_executor(executor, load_pil) for _ in range(EXECUTOR_WORKERS - 1)]
+    await asyncio.gather(*tasks)
+    logging.info("Прогрев завершен за %.3f с", time.perf_counter() - started)
+
 # Запуск фоновой задачи при старте бота
 @router.startup()
 async def on_startup():
+    if STARTUP_CONFIG.get("warmup", True):
+        try:
+            await warmup()
+        except Exception as e:
+            logging.error("Ошибка прогрева: %s", e)
     asyncio.create_task(process_painting_queue())
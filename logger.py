@@ -0,0 +1,159 @@
+# logger.py
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+from numbers import Number
+from config import LOGGING_CONFIG
+
+# Логгер для частых событий (созданные файлы и т.п.)
+EVENTS_LOGGER = "bot.events"
+
+# Аргументы этих типов не меняются после вызова, поэтому запись можно форматировать позже
+IMMUTABLE_ARG_TYPES = (str, bytes, Number, type(None))
+
+_listener = None
+_queue_handler = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Передача записей в очередь без блокировки вызывающего потока"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Форматирование откладывается до фонового потока, только если аргументы
+        # неизменяемы; иначе сообщение собирается сразу, пока аргументы актуальны
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, IMMUTABLE_ARG_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # При переполнении очереди запись отбрасывается, а не ждёт места
+            self.dropped += 1
+
+
+class BackgroundQueueListener(logging.handlers.QueueListener):
+    """Слушатель очереди с отчётом об отброшенных записях"""
+
+    def __init__(self, log_queue, queue_handler, *handlers, respect_handler_level=False):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.queue_handler = queue_handler
+        self.reported = 0
+
+    def handle(self, record):
+        super().handle(record)
+        # Когда очередь разобрана, сообщаем о записях, отброшенных с прошлого отчёта
+        if self.queue.empty():
+            self.report_dropped()
+
+    def report_dropped(self):
+        dropped = self.queue_handler.dropped
+        if dropped <= self.reported:
+            return
+        record = logging.makeLogRecord({
+            "name": __name__,
+            "levelno": logging.WARNING,
+            "levelname": "WARNING",
+            "msg": "Отброшено записей лога из-за переполнения очереди: %d",
+            "args": (dropped - self.reported,),
+        })
+        self.reported = dropped
+        super().handle(record)
+
+    def enqueue_sentinel(self):
+        # При остановке очередь может быть заполнена; ждём, пока поток её разберёт
+        self.queue.put(self._sentinel)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропуск каждой N-й записи; предупреждения и ошибки проходят всегда"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, int(rate))
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.rate == 0
+
+
+class StructuredFormatter(logging.Formatter):
+    """JSON-формат для записей с полем event, обычный формат для остальных"""
+
+    def format(self, record):
+        event = getattr(record, "event", None)
+        if not isinstance(event, dict):
+            return super().format(record)
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(event)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def setup_logging(config=LOGGING_CONFIG):
+    """Единая настройка логирования с записью в фоновом потоке"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    level = getattr(logging, str(config.get("level", "INFO")).upper(), logging.INFO)
+    mode = config.get("events_mode", "full")
+    if mode not in ("full", "sample", "structured"):
+        raise ValueError(f"Неизвестный режим логирования событий: {mode}")
+
+    if mode == "structured":
+        formatter = StructuredFormatter(config["format"])
+    else:
+        formatter = logging.Formatter(config["format"])
+
+    handlers = [logging.StreamHandler()]
+    if config.get("filename"):
+        handlers.append(logging.FileHandler(config["filename"], encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=config.get("queue_size", 0))
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    if mode == "sample":
+        rate = config.get("events_sample_rate", 10)
+        for name in config.get("sampled_loggers", [EVENTS_LOGGER]):
+            logging.getLogger(name).addFilter(SamplingFilter(rate))
+
+    _listener = BackgroundQueueListener(log_queue, _queue_handler, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Остановка фонового потока с дозаписью оставшихся записей"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener.report_dropped()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
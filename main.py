@@ -1,19 +1,41 @@
 # main.py
-from aiogram import Bot, Dispatcher
+import time
+
+# Время старта процесса для замера холодного запуска
+STARTED_AT = time.perf_counter()
+
 import logging
+from logger import setup_logging
+
+# Настройка логирования (запись в фоновом потоке через очередь)
+setup_logging()
+
+from aiogram import Bot, Dispatcher
 from handlers import router  # Импортируем роутер из handlers.py
 from config import BOT_TOKEN  # Импортируем токен из config.py
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,  # Уровень логирования (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-    format="%(asctime)s - %(levelname)s - %(message)s"  # Формат логов
-)
+logging.info("Импорт модулей завершен за %.3f с", time.perf_counter() - STARTED_AT)
+
+first_update_seen = False
+
+async def log_first_update(handler, event, data):
+    """Замер времени до первого обновления и задержки его обработки"""
+    global first_update_seen
+    if first_update_seen:
+        return await handler(event, data)
+    first_update_seen = True
+    received = time.perf_counter()
+    logging.info("Первое обновление получено через %.3f с после старта", received - STARTED_AT)
+    try:
+        return await handler(event, data)
+    finally:
+        logging.info("Первый запрос обработан за %.3f с", time.perf_counter() - received)
 
 # Инициализация бота
 bot = Bot(token=BOT_TOKEN)  # Используем токен из config.py
 dp = Dispatcher()
 dp.include_router(router)  # Подключаем роутер
+dp.update.outer_middleware(log_first_update)  # Замер холодного запуска
 
 if __name__ == "__main__":
     """
@@ -23,6 +45,6 @@ if __name__ == "__main__":
         logging.info("Бот запущен...")
         dp.run_polling(bot)  # Запуск бота с использованием aiogram
     except Exception as e:
-        logging.error(f"Ошибка при запуске бота: {e}")
+        logging.error("Ошибка при запуске бота: %s", e)
     finally:
         logging.info("Бот остановлен.")
\ No newline at end of file
@@ -0,0 +1,67 @@
+# pack_cache.py
+import os
+import threading
+import logging
+
+
+class PackCache:
+    """Дисковый кэш готовых ресурспаков с ограничением размера и вытеснением LRU"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mcpack")
+
+    def get(self, key):
+        """Чтение архива из кэша; None, если его нет"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                # Время изменения служит меткой последнего использования
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            except OSError as e:
+                logging.error("Ошибка чтения кэша ресурспаков: %s", e)
+                return None
+        return data
+
+    def put(self, key, data):
+        """Сохранение архива в кэш с вытеснением давно не использованных"""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+                self._evict()
+            except OSError as e:
+                logging.error("Ошибка записи кэша ресурспаков: %s", e)
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".mcpack"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            logging.info("Ресурспак вытеснен из кэша: %s", path)
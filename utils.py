@@ -1,4 +1,3 @@
-from PIL import Image, ImageDraw, ImageOps
 import io
 import zipfile
 import os
@@ -6,13 +5,116 @@ import uuid
 import shutil
 import json
 import logging
-from config import NEW_PAINTING_IMAGE_SIZES
+import hashlib
+import importlib
+import threading
+from functools import lru_cache
+from config import NEW_PAINTING_IMAGE_SIZES, STARTUP_CONFIG, PACK_BUILD_CONFIG
+from logger import EVENTS_LOGGER
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[logging.FileHandler("bot.log"), logging.StreamHandler()]
-)
+events_log = logging.getLogger(EVENTS_LOGGER)
+
+# Форматы, которые Pillow пробует при открытии изображений (None — все)
+IMAGE_FORMATS = STARTUP_CONFIG.get("image_formats")
+
+# Модули Pillow для поддерживаемых кодеков
+PIL_PLUGINS = {
+    "PNG": "PngImagePlugin",
+    "JPEG": "JpegImagePlugin",
+    "GIF": "GifImagePlugin",
+    "BMP": "BmpImagePlugin",
+    "WEBP": "WebPImagePlugin",
+}
+
+# Детерминированная сборка: UUID из дайджеста входных данных, фиксированные метаданные ZIP
+DETERMINISTIC_BUILDS = PACK_BUILD_CONFIG.get("deterministic", False)
+# Версия сборки: увеличить при изменении манифеста или обработки изображений,
+# чтобы сменились UUID и ключи кэша готовых архивов
+PACK_CACHE_VERSION = 1
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+_pil = None
+_pil_lock = threading.Lock()
+
+def load_pil():
+    """Отложенный импорт Pillow с загрузкой только нужных кодеков"""
+    global _pil
+    if _pil is None:
+        with _pil_lock:
+            if _pil is None:
+                from PIL import Image, ImageDraw, ImageOps
+                # Регистрируем только нужные кодеки; Image.open с formats=
+                # не загружает остальные плагины
+                for fmt in IMAGE_FORMATS or ():
+                    importlib.import_module(f"PIL.{PIL_PLUGINS[fmt.upper()]}")
+                _pil = (Image, ImageDraw, ImageOps)
+    return _pil
+
+def open_image(data):
+    """Открытие изображения из байтов с ограничением форматов"""
+    Image, _, _ = load_pil()
+    return Image.open(io.BytesIO(data), formats=IMAGE_FORMATS).convert("RGBA")
+
+@lru_cache(maxsize=None)
+def load_template(template_path):
+    """Декодирование шаблона (кэшируется, использовать через copy())"""
+    Image, _, _ = load_pil()
+    return Image.open(template_path, formats=IMAGE_FORMATS).convert("RGBA")
+
+@lru_cache(maxsize=None)
+def template_rectangle(template_path, target_color):
+    """Поиск области на шаблоне (кэшируется только успешный результат)"""
+    rect = find_rectangle(load_template(template_path), target_color)
+    if rect is None:
+        raise ValueError(f"Область цвета {target_color} не найдена на шаблоне {template_path}")
+    return rect
+
+def hex_to_rgba(color):
+    """Преобразование цвета #RRGGBB в кортеж RGBA"""
+    return tuple(int(color[j:j+2], 16) for j in (1, 3, 5)) + (255,)
+
+def warmup_templates(shield_path, painting_path, colors):
+    """Прогрев кэша шаблонов и областей перед первым запросом"""
+    regions = [(shield_path, (255, 0, 0, 255)), (shield_path, (0, 255, 0, 255))]
+    regions += [(painting_path, hex_to_rgba(color)) for color in colors]
+    for template_path, color in regions:
+        try:
+            template_rectangle(template_path, color)
+        except ValueError as e:
+            logging.warning("Прогрев области пропущен: %s", e)
+
+def _update_digest(digest, value):
+    if isinstance(value, dict):
+        digest.update(b"d%d:" % len(value))
+        for key in sorted(value):
+            _update_digest(digest, key)
+            _update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"l%d:" % len(value))
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        digest.update(b"s%d:" % len(data))
+        digest.update(data)
+    elif isinstance(value, int):
+        digest.update(b"i%d:" % value)
+    else:
+        data = bytes(value)
+        digest.update(b"b%d:" % len(data))
+        digest.update(data)
+
+def pack_digest(*parts):
+    """Дайджест входных данных сборки (строки, числа, байты, списки и словари)"""
+    digest = hashlib.sha256()
+    _update_digest(digest, parts)
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def template_digest(template_path):
+    """Дайджест файла шаблона (кэшируется)"""
+    with open(template_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
 def validate_data(data):
     """Проверка и преобразование данных в bytes"""
@@ -26,7 +128,7 @@ def validate_data(data):
                 return b''
             return bytes(data)
         except Exception as e:
-            logging.error(f"Невозможно преобразовать данные в bytes: {e}")
+            logging.error("Невозможно преобразовать данные в bytes: %s", e)
             return b''
     return data
 
@@ -40,7 +142,8 @@ def process_image(image_bytes, selected_resource, filename=None):
         if selected_resource == "new_painting" and not filename:
             raise ValueError("Требуется имя файла для New Painting")
 
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+        Image, ImageDraw, ImageOps = load_pil()
+        image = open_image(image_bytes)
         
         if selected_resource == "ender_pearl":
             mask = Image.new("L", image.size, 0)
@@ -65,7 +168,7 @@ def process_image(image_bytes, selected_resource, filename=None):
         return output.getvalue()
         
     except Exception as e:
-        logging.error(f"Ошибка обработки изображения: {e}")
+        logging.error("Ошибка обработки изображения: %s", e)
         return None
 
 def process_shield(front_bytes, back_bytes, template_path):
@@ -74,15 +177,12 @@ def process_shield(front_bytes, back_bytes, template_path):
         front_bytes = validate_data(front_bytes)
         back_bytes = validate_data(back_bytes)
         
-        template = Image.open(template_path).convert("RGBA")
-        front = Image.open(io.BytesIO(front_bytes)).convert("RGBA")
-        back = Image.open(io.BytesIO(back_bytes)).convert("RGBA")
+        template = load_template(template_path)
+        front = open_image(front_bytes)
+        back = open_image(back_bytes)
 
-        red_rect = find_rectangle(template, (255, 0, 0, 255))
-        green_rect = find_rectangle(template, (0, 255, 0, 255))
-
-        if not red_rect or not green_rect:
-            raise ValueError("Не найдены маркерные области на шаблоне")
+        red_rect = template_rectangle(template_path, (255, 0, 0, 255))
+        green_rect = template_rectangle(template_path, (0, 255, 0, 255))
 
         front = front.resize((red_rect[2]-red_rect[0], red_rect[3]-red_rect[1]))
         back = back.resize((green_rect[2]-green_rect[0], green_rect[3]-green_rect[1]))
@@ -96,33 +196,27 @@ def process_shield(front_bytes, back_bytes, template_path):
         return output.getvalue()
         
     except Exception as e:
-        logging.error(f"Ошибка обработки щита: {e}")
+        logging.error("Ошибка обработки щита: %s", e)
         return None
 
 def process_painting(images_bytes, template_path, colors):
     """Обработка картины с валидацией данных"""
     try:
         validated_images = [validate_data(img) for img in images_bytes]
-        template = Image.open(template_path).convert("RGBA")
-        result = template.copy()
+        result = load_template(template_path).copy()
         
         for i, img_bytes in enumerate(validated_images):
             if i >= len(colors) or not img_bytes:
                 continue
                 
             try:
-                color = tuple(int(colors[i][j:j+2], 16) for j in (1,3,5)) + (255,)
-                rect = find_rectangle(template, color)
-                
-                if not rect:
-                    continue
-                    
-                image = Image.open(io.BytesIO(img_bytes)).convert("RGBA")
+                rect = template_rectangle(template_path, hex_to_rgba(colors[i]))
+                image = open_image(img_bytes)
                 image = image.resize((rect[2]-rect[0], rect[3]-rect[1]))
                 result.paste(image, rect[:2], image)
 
             except Exception as e:
-                logging.error(f"Ошибка обработки изображения {i}: {e}")
+                logging.error("Ошибка обработки изображения %d: %s", i, e)
                 continue
 
         output = io.BytesIO()
@@ -130,30 +224,24 @@ def process_painting(images_bytes, template_path, colors):
         return output.getvalue()
         
     except Exception as e:
-        logging.error(f"Ошибка обработки картины: {e}")
+        logging.error("Ошибка обработки картины: %s", e)
         return None
 
 def find_rectangle(image, target_color):
     """Поиск прямоугольной области по цвету"""
     try:
-        pixels = image.load()
-        width, height = image.size
-        bounds = [width, height, 0, 0]
-        
-        for x in range(width):
-            for y in range(height):
-                if pixels[x, y] == target_color:
-                    bounds[0] = min(bounds[0], x)
-                    bounds[1] = min(bounds[1], y)
-                    bounds[2] = max(bounds[2], x)
-                    bounds[3] = max(bounds[3], y)
-                    
-        if bounds[0] > bounds[2] or bounds[1] > bounds[3]:
-            return None
-            
-        return (bounds[0], bounds[1], bounds[2]+1, bounds[3]+1)
+        load_pil()
+        from PIL import ImageChops
+
+        # Маска пикселей целевого цвета строится по каналам средствами Pillow
+        mask = None
+        for band, value in zip(image.split(), target_color):
+            band_mask = band.point([255 if v == value else 0 for v in range(256)])
+            mask = band_mask if mask is None else ImageChops.multiply(mask, band_mask)
+
+        return mask.getbbox() if mask is not None else None
     except Exception as e:
-        logging.error(f"Ошибка поиска прямоугольника: {e}")
+        logging.error("Ошибка поиска прямоугольника: %s", e)
         return None
 
 def create_resource_pack(image_data, pack_name, resource_type):
@@ -187,7 +275,7 @@ def create_resource_pack(image_data, pack_name, resource_type):
                 path = os.path.join(textures_dir, "painting", filename)
                 with open(path, "wb") as f:
                     f.write(data)
-                logging.info(f"Создан файл: {path} ({len(data)} байт)")
+                events_log.info("Создан файл: %s (%d байт)", path, len(data), extra={"event": {"path": path, "size": len(data)}})
                 
         elif resource_type == "painting":
             image_data = validate_data(image_data)
@@ -197,7 +285,7 @@ def create_resource_pack(image_data, pack_name, resource_type):
             path = os.path.join(textures_dir, "painting", f"kz.png")
             with open(path, "wb") as f:
                 f.write(image_data)
-            logging.info(f"Создан файл: {path} ({len(image_data)} байт)")
+            events_log.info("Создан файл: %s (%d байт)", path, len(image_data), extra={"event": {"path": path, "size": len(image_data)}})
             
         elif resource_type == "shield":
             image_data = validate_data(image_data)
@@ -207,7 +295,7 @@ def create_resource_pack(image_data, pack_name, resource_type):
             path = os.path.join(textures_dir, "entity", "shield.png")
             with open(path, "wb") as f:
                 f.write(image_data)
-            logging.info(f"Создан файл: {path} ({len(image_data)} байт)")
+            events_log.info("Создан файл: %s (%d байт)", path, len(image_data), extra={"event": {"path": path, "size": len(image_data)}})
             
         elif resource_type == "ender_pearl":
             image_data = validate_data(image_data)
@@ -217,7 +305,7 @@ def create_resource_pack(image_data, pack_name, resource_type):
             path = os.path.join(textures_dir, "items", "ender_pearl.png")
             with open(path, "wb") as f:
                 f.write(image_data)
-            logging.info(f"Создан файл: {path} ({len(image_data)} байт)")
+            events_log.info("Создан файл: %s (%d байт)", path, len(image_data), extra={"event": {"path": path, "size": len(image_data)}})
             
         elif resource_type == "totem":
             image_data = validate_data(image_data)
@@ -227,25 +315,33 @@ def create_resource_pack(image_data, pack_name, resource_type):
             path = os.path.join(textures_dir, "items", "totem.png")
             with open(path, "wb") as f:
                 f.write(image_data)
-            logging.info(f"Создан файл: {path} ({len(image_data)} байт)")
+            events_log.info("Создан файл: %s (%d байт)", path, len(image_data), extra={"event": {"path": path, "size": len(image_data)}})
             
         else:
             raise ValueError(f"Неизвестный тип ресурса: {resource_type}")
 
+        if DETERMINISTIC_BUILDS:
+            digest = pack_digest(PACK_CACHE_VERSION, resource_type, pack_name[:64], image_data)
+            header_uuid = uuid.uuid5(uuid.NAMESPACE_URL, f"{digest}:header")
+            module_uuid = uuid.uuid5(uuid.NAMESPACE_URL, f"{digest}:module")
+        else:
+            header_uuid = uuid.uuid4()
+            module_uuid = uuid.uuid4()
+
         # Создание манифеста
         manifest = {
             "format_version": 1,
             "header": {
                 "description": "TELEGRAM: https://t.me/hentai_mcpack_bot",
                 "name": pack_name[:64],
-                "uuid": str(uuid.uuid4()),
+                "uuid": str(header_uuid),
                 "version": [6, 6, 6],
                 "min_engine_version": [1, 2, 6]
             },
             "modules": [{
                 "description": "TELEGRAM: https://t.me/hentai_mcpack_bot",
                 "type": "resources",
-                "uuid": str(uuid.uuid4()),
+                "uuid": str(module_uuid),
                 "version": [6, 6, 6]
             }]
         }
@@ -254,14 +350,31 @@ def create_resource_pack(image_data, pack_name, resource_type):
         with open(manifest_path, "w", encoding="utf-8") as f:
             json.dump(manifest, f, indent=2, ensure_ascii=False)
             
-        logging.info(f"Создан манифест: {manifest_path}")
+        logging.info("Создан манифест: %s", manifest_path)
 
     except Exception as e:
-        logging.error(f"Ошибка создания ресурспака: {e}")
+        logging.error("Ошибка создания ресурспака: %s", e)
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
         raise
 
+def write_deterministic_entries(zipf, temp_dir):
+    """Запись файлов в отсортированном порядке с фиксированными метаданными"""
+    entries = []
+    for root, _, files in os.walk(temp_dir):
+        for file in files:
+            path = os.path.join(root, file)
+            arcname = os.path.relpath(path, temp_dir).replace(os.sep, "/")
+            entries.append((arcname, path))
+
+    for arcname, path in sorted(entries):
+        info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.create_system = 3
+        info.external_attr = 0o644 << 16
+        with open(path, "rb") as f:
+            zipf.writestr(info, f.read())
+
 def create_zip_file(pack_name):
     """Создание ZIP-архива с контролем ошибок"""
     temp_dir = "temp_resourcepack"
@@ -272,20 +385,23 @@ def create_zip_file(pack_name):
             raise FileNotFoundError("Временная директория не найдена")
             
         with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    path = os.path.join(root, file)
-                    arcname = os.path.relpath(path, temp_dir)
-                    zipf.write(path, arcname)
+            if DETERMINISTIC_BUILDS:
+                write_deterministic_entries(zipf, temp_dir)
+            else:
+                for root, _, files in os.walk(temp_dir):
+                    for file in files:
+                        path = os.path.join(root, file)
+                        arcname = os.path.relpath(path, temp_dir)
+                        zipf.write(path, arcname)
                     
         zip_size = len(zip_buffer.getvalue())
-        logging.info(f"Размер ZIP-архива: {zip_size/1024:.2f} KB")
+        logging.info("Размер ZIP-архива: %.2f KB", zip_size / 1024)
         
         if zip_size > 50 * 1024 * 1024:
             raise ValueError(f"Превышен лимит размера файла: {zip_size/1024/1024:.2f} MB")
             
     except Exception as e:
-        logging.error(f"Ошибка создания ZIP: {e}")
+        logging.error("Ошибка создания ZIP: %s", e)
         raise
     finally:
         if os.path.exists(temp_dir):